@@ -69,6 +69,11 @@ class AnalogFileWriter:
         # Ensure timestamp is updated
         from datetime import datetime
         self.metadata['timestamp'] = datetime.now().isoformat()
+        
+        # Samples are always written as float32, whatever the input used
+        self.metadata['dtype'] = 'float32'
+        self.metadata.pop('scale', None)
+        self.metadata.pop('offset', None)
         if 'scrambled' not in self.metadata:
             self.metadata['scrambled'] = True
         
@@ -73,6 +73,11 @@ class AnalogFileWriter:
         self.file.write(struct.pack('<I', self.VERSION))
         
         self.metadata['timestamp'] = datetime.now().isoformat()
+        
+        # Samples are always written as float32, whatever the input used
+        self.metadata['dtype'] = 'float32'
+        self.metadata.pop('scale', None)
+        self.metadata.pop('offset', None)
         self.metadata['scrambled'] = True
         
         metadata_json = json.dumps(self.metadata, indent=2)
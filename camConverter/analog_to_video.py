@@ -81,6 +81,11 @@ class AnalogFileReader:
             metadata_bytes = self.file.read(metadata_len)
             self.metadata = json.loads(metadata_bytes.decode('utf-8'))
             
+            # On-disk sample type (older files are always float32)
+            self._dtype = np.dtype(self.metadata.get('dtype', 'float32')).newbyteorder('<')
+            self._scale = np.float32(self.metadata.get('scale', 1.0))
+            self._offset = np.float32(self.metadata.get('offset', 0.0))
+            
             logging.info(f"Opened analog file: {self.filename}")
             logging.info(f"Format: {self.metadata['standard']}, "
                         f"{self.metadata['resolution'][0]}x{self.metadata['resolution'][1]}, "
@@ -100,13 +105,18 @@ class AnalogFileReader:
         
         try:
             samples_per_frame = self.metadata['samples_per_frame']
-            bytes_to_read = samples_per_frame * 4  # float32
+            bytes_to_read = samples_per_frame * self._dtype.itemsize
             
             data = self.file.read(bytes_to_read)
             if len(data) < bytes_to_read:
                 return None  # EOF
             
-            signal = np.frombuffer(data, dtype=np.float32)
+            signal = np.frombuffer(data, dtype=self._dtype)
+            if self._dtype.kind == 'i':
+                # Dequantize int16 codes back to voltages
+                signal = signal * self._scale + self._offset
+            elif self._dtype.itemsize != 4:
+                signal = signal.astype(np.float32)
             self.frames_read += 1
             return signal
             
@@ -142,6 +152,9 @@ class CompositeDecoder:
         # Calculate timing
         self._calculate_timing()
         
+        # Line resampling weights (active_length -> width), computed once
+        self._resample = self._create_resample_weights()
+        
     def _calculate_timing(self):
         """Calculate sample positions for line decoding."""
         # Approximate timing based on standard
@@ -163,6 +176,15 @@ class CompositeDecoder:
         logging.debug(f"Decode timing: active starts at sample {self.active_start}, "
                      f"length {self.active_length}")
     
+    def _create_resample_weights(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Precompute np.interp gather indices/offsets (endpoint-aligned)."""
+        width = self.resolution[0]
+        x_old = np.linspace(0, 1, self.active_length)
+        x_new = np.linspace(0, 1, width)
+        idx = np.searchsorted(x_old, x_new, side='right') - 1
+        idx = np.clip(idx, 0, self.active_length - 2)
+        return idx, x_new - x_old[idx], x_old[idx + 1] - x_old[idx]
+    
     def extract_line(self, signal: np.ndarray, line_num: int) -> np.ndarray:
         """Extract one horizontal line from the signal."""
         start = line_num * self.samples_per_line
@@ -195,21 +217,31 @@ class CompositeDecoder:
         # Allocate output frame
         frame = np.zeros((height, width), dtype=np.uint8)
         
-        # Decode active lines
-        for i in range(self.active_lines):
-            line_num = vblank_top + i
-            line_pixels = self.extract_line(signal, line_num)
+        # View the active lines as a (lines, samples_per_line) raster and
+        # slice out the active video of every line at once
+        lines = min(self.active_lines, len(signal) // self.samples_per_line - vblank_top)
+        if lines > 0:
+            start = vblank_top * self.samples_per_line
+            raster = signal[start:start + lines * self.samples_per_line].reshape(
+                lines, self.samples_per_line)
+            active = raster[:, self.active_start:self.active_start + self.active_length]
             
-            if line_pixels is None:
-                break
+            # Normalize from voltage to 0-255 in one pass
+            active = np.clip(active, self.black, self.white)
+            normalized = (active - self.black) / (self.white - self.black)
+            pixels = (normalized * 255).astype(np.uint8)
             
-            # Resample to target width if needed
-            if len(line_pixels) != width:
-                x_old = np.linspace(0, 1, len(line_pixels))
-                x_new = np.linspace(0, 1, width)
-                line_pixels = np.interp(x_new, x_old, line_pixels).astype(np.uint8)
+            # Resample all lines to target width at once, with the same
+            # endpoint-aligned linear interpolation as np.interp
+            if pixels.shape[1] != width:
+                idx, dx, dxp = self._resample
+                left = pixels[:, idx].astype(np.float64)
+                right = pixels[:, idx + 1]
+                resampled = (right - left) / dxp * dx + left
+                resampled[:, -1] = pixels[:, -1]  # last sample lands exactly on the end
+                pixels = resampled.astype(np.uint8)
             
-            frame[i, :] = line_pixels
+            frame[:lines, :] = pixels
         
         # Convert to BGR for OpenCV
         frame_bgr = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
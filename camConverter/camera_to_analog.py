@@ -21,6 +21,7 @@ Date: November 2025
 import os
 import sys
 import time
+import fcntl
 import signal
 import struct
 import logging
@@ -28,7 +29,7 @@ import argparse
 import threading
 from queue import Queue, Empty
 from pathlib import Path
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Union
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -36,6 +37,16 @@ import cv2
 import numpy as np
 
 
+# Requested FIFO pipe buffer size (Linux default is 64 KiB)
+FIFO_PIPE_SIZE = 1 << 20
+
+# Pipe buffer size assumed when it cannot be resized or queried
+DEFAULT_PIPE_SIZE = 1 << 16
+
+# Seconds between preview refreshes; a GUI round-trip per frame stalls the loop
+PREVIEW_INTERVAL = 0.2
+
+
 @dataclass
 class Config:
     """Configuration class for the camera to analog converter."""
@@ -50,6 +61,7 @@ class Config:
     downsample_factor: int = 8  # reduce frame resolution for sampling
     voltage_range: float = 3.3  # volts
     test_mode: bool = False  # use synthetic data instead of camera
+    max_repeat_gap: float = 1.0  # seconds before an unchanged frame is re-sent
     
     @property
     def max_adc_value(self) -> int:
@@ -70,6 +82,7 @@ class CameraCapture:
         self.cap = None
         self.frame_queue = Queue(maxsize=5)
         self.running = False
+        self.raw_yuy2 = False  # camera delivers raw YUY2 instead of BGR
         
     def initialize_camera(self) -> bool:
         """Initialize the camera."""
@@ -90,8 +103,29 @@ class CameraCapture:
                 logging.error("\nTry running with --test-mode to use synthetic data")
                 return False
                 
+            # Ask for raw YUY2 so the luma plane can be used directly,
+            # skipping the BGR decode and the later BGR->gray pass
+            default_fourcc = self.cap.get(cv2.CAP_PROP_FOURCC)
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'YUY2'))
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            
             # Test frame capture
             ret, test_frame = self.cap.read()
+            if ret and test_frame.ndim == 3 and test_frame.shape[2] == 2:
+                self.raw_yuy2 = True
+                logging.info("Camera delivers raw YUY2, using Y plane directly")
+            else:
+                # Backend rejected the request (read failed) or returned an
+                # opaque buffer: restore the default format and retry
+                if default_fourcc:
+                    self.cap.set(cv2.CAP_PROP_FOURCC, default_fourcc)
+                self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+                ret, test_frame = self.cap.read()
+                if not ret:
+                    # Some backends stay broken after the request; reopen
+                    self.cap.release()
+                    self.cap = cv2.VideoCapture(self.config.camera_id)
+                    ret, test_frame = self.cap.read()
             if not ret:
                 logging.error("Camera opened but cannot capture frames")
                 logging.error("This usually indicates a permission issue on macOS")
@@ -123,24 +157,26 @@ class CameraCapture:
     def capture_loop(self):
         """Main capture loop running in separate thread."""
         self.running = True
-        frame_time = self.config.frame_period
+        period_ns = int(1e9 / self.config.sample_rate)
+        next_deadline = time.monotonic_ns() + period_ns
         frame_counter = 0
         
         while self.running:
-            start_time = time.time()
-            
             if self.config.test_mode:
                 # Generate synthetic frame for testing
                 frame = self.generate_test_frame(frame_counter)
                 ret = True
             else:
                 ret, frame = self.cap.read()
+                if ret and self.raw_yuy2:
+                    frame = frame[:, :, 0]  # Y plane view, no copy
             
             if not ret:
                 logging.warning("Failed to capture frame")
                 if self.config.test_mode:
                     break  # Should not happen in test mode
                 time.sleep(0.1)  # Wait a bit before retrying
+                next_deadline = time.monotonic_ns() + period_ns
                 continue
                 
             # Put frame in queue (non-blocking)
@@ -156,11 +192,15 @@ class CameraCapture:
             
             frame_counter += 1
             
-            # Maintain frame rate
-            elapsed = time.time() - start_time
-            sleep_time = max(0, frame_time - elapsed)
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+            # Maintain frame rate against an absolute monotonic deadline
+            now = time.monotonic_ns()
+            remaining = next_deadline - now
+            if remaining > 0:
+                time.sleep(remaining / 1e9)
+                next_deadline += period_ns
+            else:
+                # Fell behind; re-anchor instead of bursting to catch up
+                next_deadline = now + period_ns
     
     def generate_test_frame(self, frame_counter: int) -> np.ndarray:
         """Generate a synthetic test frame."""
@@ -202,11 +242,26 @@ class AnalogConverter:
     
     def __init__(self, config: Config):
         self.config = config
+        # Grayscale buffer reused across frames (camera default 640x480)
+        self._gray = np.empty((480, 640), dtype=np.uint8)
+        # Thumbnail hash of the last emitted frame, for skipping repeats
+        self._last_hash = None
+        self._last_emit = 0.0
+        
+    def frame_to_analog(self, frame: np.ndarray) -> Optional[List[int]]:
+        """Convert frame to analog ADC values.
         
-    def frame_to_analog(self, frame: np.ndarray) -> List[int]:
-        """Convert frame to analog ADC values."""
-        # Convert to grayscale
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        Returns None if the frame is unchanged since the last emitted one
+        and less than max_repeat_gap seconds have passed.
+        """
+        # Convert to grayscale into the preallocated buffer (YUY2 luma
+        # frames arrive already single-channel)
+        if frame.ndim == 2:
+            gray = frame
+        else:
+            if self._gray.shape != frame.shape[:2]:
+                self._gray = np.empty(frame.shape[:2], dtype=np.uint8)
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
         
         # Downsample for performance
         height, width = gray.shape
@@ -214,6 +269,14 @@ class AnalogConverter:
         step_x = max(1, width // self.config.downsample_factor)
         downsampled = gray[::step_y, ::step_x]
         
+        # Skip idle frames: identical thumbnail produces identical ADC values
+        frame_hash = hash(downsampled.tobytes())
+        now = time.monotonic()
+        if frame_hash == self._last_hash and (now - self._last_emit) < self.config.max_repeat_gap:
+            return None
+        self._last_hash = frame_hash
+        self._last_emit = now
+        
         # Generate multiple channels from different regions
         channels = []
         h, w = downsampled.shape
@@ -252,9 +315,9 @@ class AnalogConverter:
         
         return channels
     
-    def adc_to_voltage(self, adc_value: int) -> float:
-        """Convert ADC value to voltage."""
-        return (adc_value / self.config.max_adc_value) * self.config.voltage_range
+    def adc_to_voltage(self, adc_value: Union[int, np.ndarray]) -> Union[float, np.ndarray]:
+        """Convert ADC value (or array of values) to voltage."""
+        return adc_value * (self.config.voltage_range / self.config.max_adc_value)
 
 
 class FIFOStreamer:
@@ -265,6 +328,16 @@ class FIFOStreamer:
         self.fifo_fd = None
         self.sample_queue = Queue()
         self.running = False
+        # Pack samples no wider than the ADC needs (uint8 up to 8 bits);
+        # compiled once so the format isn't reparsed per sample
+        code = "B" if config.adc_resolution <= 8 else "H"
+        self._sample_struct = struct.Struct(f"<{config.channels}{code}")
+        # Precompiled CSV line format: timestamp,ch0,ch1,...
+        self._csv_fmt = ("%.6f," + ",".join(["%u"] * config.channels) + "\n").encode()
+        # Bytes not yet accepted by the non-blocking FIFO
+        self._pending = bytearray()
+        self._pipe_size = DEFAULT_PIPE_SIZE  # backlog limit, set from the real pipe
+        self._dropped = 0  # samples dropped during the current reader stall
         
     def create_fifo(self) -> bool:
         """Create the FIFO if it doesn't exist."""
@@ -291,6 +364,22 @@ class FIFOStreamer:
             # This will block until a reader connects
             self.fifo_fd = os.open(self.config.fifo_path, os.O_WRONLY)
             logging.info("FIFO reader connected")
+            
+            # Enlarge the pipe buffer so short reader stalls don't block us
+            # (Linux only; may fail with EPERM above /proc/sys/fs/pipe-max-size)
+            setpipe_sz = getattr(fcntl, "F_SETPIPE_SZ", None)
+            if setpipe_sz is not None:
+                try:
+                    self._pipe_size = fcntl.fcntl(self.fifo_fd, setpipe_sz, FIFO_PIPE_SIZE)
+                    logging.info(f"FIFO pipe buffer: {self._pipe_size} bytes")
+                except OSError as e:
+                    logging.warning(f"Could not resize FIFO pipe buffer: {e}")
+                    try:
+                        self._pipe_size = fcntl.fcntl(self.fifo_fd, fcntl.F_GETPIPE_SZ)
+                    except (AttributeError, OSError):
+                        pass
+            
+            os.set_blocking(self.fifo_fd, False)
             return True
             
         except Exception as e:
@@ -301,31 +390,58 @@ class FIFOStreamer:
         """Write samples to FIFO."""
         try:
             if self.config.data_format == "binary":
-                # Pack as little-endian uint16
-                data = struct.pack(f"<{len(samples)}H", *samples)
-                os.write(self.fifo_fd, data)
+                # Pack as uint8 (<= 8-bit ADC) or little-endian uint16
+                data = self._sample_struct.pack(*samples)
                 
             elif self.config.data_format == "csv":
                 # Write as CSV line
-                csv_line = f"{timestamp:.6f}," + ",".join(map(str, samples)) + "\n"
-                os.write(self.fifo_fd, csv_line.encode())
+                data = self._csv_fmt % (timestamp, *samples)
+            
+            else:
+                return
+            
+            # Warn once when the reader stalls and once when it recovers
+            self.flush_pending()
+            if len(self._pending) + len(data) > self._pipe_size:
+                if not self._dropped:
+                    logging.warning("FIFO reader stalled, dropping samples")
+                self._dropped += 1
+                return
+            if self._dropped:
+                logging.warning(f"FIFO reader recovered, dropped {self._dropped} samples")
+                self._dropped = 0
+            self._pending += data
+            self.flush_pending()
                 
         except Exception as e:
             logging.error(f"Failed to write to FIFO: {e}")
             raise
     
+    def flush_pending(self):
+        """Write as much pending data as the FIFO accepts without blocking."""
+        while self._pending:
+            try:
+                written = os.write(self.fifo_fd, self._pending)
+            except BlockingIOError:
+                return
+            del self._pending[:written]
+    
     def streaming_loop(self):
         """Main streaming loop running in separate thread."""
         self.running = True
         
         while self.running:
             try:
-                # Get samples from queue (blocking with timeout)
-                samples, timestamp = self.sample_queue.get(timeout=1.0)
+                # Get samples from queue (blocking with timeout); poll
+                # quickly while data is still waiting on a full pipe
+                timeout = 0.01 if self._pending else 1.0
+                try:
+                    samples, timestamp = self.sample_queue.get(timeout=timeout)
+                except Empty:
+                    self.flush_pending()
+                    continue
                 self.write_samples(samples, timestamp)
                 
-            except Empty:
-                continue
             except Exception as e:
                 logging.error(f"Streaming error: {e}")
                 break
@@ -419,6 +535,8 @@ class CameraToAnalogConverter:
         frame_count = 0
         start_time = time.time()
         
+        last_preview = 0.0
+        
         try:
             while self.running:
                 # Get latest frame
@@ -431,19 +549,24 @@ class CameraToAnalogConverter:
                 timestamp = time.time()
                 samples = self.converter.frame_to_analog(frame)
                 
-                # Queue for FIFO streaming
-                self.streamer.queue_samples(samples, timestamp)
-                
-                # Logging
-                frame_count += 1
-                if frame_count % 30 == 0:  # Log every 30 frames
-                    elapsed = time.time() - start_time
-                    fps = frame_count / elapsed
-                    voltages = [self.converter.adc_to_voltage(s) for s in samples]
-                    logging.info(f"FPS: {fps:.1f}, ADC: {samples}, Voltage: {[f'{v:.2f}V' for v in voltages]}")
+                # Unchanged frames are not streamed or logged
+                if samples is not None:
+                    # Queue for FIFO streaming
+                    self.streamer.queue_samples(samples, timestamp)
+                    
+                    # Logging
+                    frame_count += 1
+                    if frame_count % 30 == 0 and logging.getLogger().isEnabledFor(logging.INFO):
+                        elapsed = time.time() - start_time
+                        fps = frame_count / elapsed
+                        voltages = self.converter.adc_to_voltage(np.asarray(samples, dtype=np.float32))
+                        voltages = np.round(voltages, 2)
+                        logging.info("FPS: %.1f, ADC: %s, Voltage (V): %s", fps, samples, voltages)
                 
-                # Show preview if enabled
-                if self.config.preview:
+                # Show preview if enabled (time-gated, so it keeps handling
+                # GUI events and 'q' even while the scene is static)
+                if self.config.preview and timestamp - last_preview >= PREVIEW_INTERVAL:
+                    last_preview = timestamp
                     cv2.imshow("Camera Feed", frame)
                     if cv2.waitKey(1) & 0xFF == ord('q'):
                         break
@@ -509,6 +632,8 @@ def parse_arguments() -> Config:
                        help="Frame downsampling factor")
     parser.add_argument("--voltage-range", type=float, default=3.3,
                        help="ADC voltage range")
+    parser.add_argument("--max-repeat-gap", type=float, default=1.0,
+                       help="Seconds before an unchanged frame is sent again")
     
     args = parser.parse_args()
     
@@ -523,7 +648,8 @@ def parse_arguments() -> Config:
         preview=not args.no_preview,
         downsample_factor=args.downsample_factor,
         voltage_range=args.voltage_range,
-        test_mode=args.test_mode
+        test_mode=args.test_mode,
+        max_repeat_gap=args.max_repeat_gap
     )
 
 
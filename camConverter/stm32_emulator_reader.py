@@ -18,17 +18,15 @@ Author: GitHub Copilot
 Date: November 2025
 """
 
+import io
 import os
 import sys
 import time
-import struct
 import signal
 import argparse
 import threading
 from typing import List, Tuple, Optional
-from dataclasses import dataclass
-from collections import deque
-from datetime import datetime
+from dataclasses import dataclass, field
 
 import numpy as np
 
@@ -41,6 +39,51 @@ except ImportError:
     PLOT_AVAILABLE = False
     print("Warning: matplotlib not available. Real-time plotting disabled.")
 
+# Optional JIT support for the ADC conversion kernel
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+# Maximum number of binary samples pulled from the FIFO per read
+READ_BATCH = 256
+
+# Seconds to wait before polling again after the writer closed the FIFO
+EOF_RETRY_INTERVAL = 0.1
+
+# Maximum bytes of CSV text pulled from the FIFO per read
+CSV_CHUNK = 1 << 16
+
+# Seconds between bulk writes of the output CSV
+OUTPUT_FLUSH_INTERVAL = 1.0
+
+
+def _adc_batch_to_voltage(adc: np.ndarray, vpc: float, max_adc: int,
+                          out: np.ndarray) -> np.ndarray:
+    """Clamp (N, channels) ADC counts and scale them to volts into `out`."""
+    for i in range(adc.shape[0]):
+        for j in range(adc.shape[1]):
+            value = adc[i, j]
+            if value < 0:
+                value = 0
+            elif value > max_adc:
+                value = max_adc
+            out[i, j] = value * vpc
+    return out
+
+
+if NUMBA_AVAILABLE:
+    adc_batch_to_voltage = njit(cache=True, fastmath=True)(_adc_batch_to_voltage)
+else:
+    def adc_batch_to_voltage(adc: np.ndarray, vpc: float, max_adc: int,
+                             out: np.ndarray) -> np.ndarray:
+        """NumPy fallback for the JIT kernel."""
+        np.clip(adc, 0, max_adc, out=out)
+        out *= vpc
+        return out
+
 
 @dataclass
 class EmulatorConfig:
@@ -56,41 +99,100 @@ class EmulatorConfig:
     log_interval: int = 100  # samples between log outputs
     output_file: Optional[str] = None
     
-    @property
-    def max_adc_value(self) -> int:
-        """Maximum ADC value based on resolution."""
-        return (2 ** self.adc_resolution) - 1
+    # Derived values, computed once in __post_init__ so hot loops read a
+    # plain attribute instead of re-evaluating a property
+    max_adc_value: int = field(init=False, repr=False)  # maximum ADC count
+    voltage_per_count: float = field(init=False, repr=False)  # volts per count
+    sample_width: int = field(init=False, repr=False)  # bytes per binary sample
     
-    @property
-    def voltage_per_count(self) -> float:
-        """Voltage per ADC count."""
-        return self.voltage_range / self.max_adc_value
+    def __post_init__(self):
+        self.max_adc_value = (2 ** self.adc_resolution) - 1
+        self.voltage_per_count = self.voltage_range / self.max_adc_value
+        # uint8 up to 8-bit ADCs, else uint16
+        self.sample_width = 1 if self.adc_resolution <= 8 else 2
 
 
 class SampleBuffer:
-    """Thread-safe circular buffer for samples."""
-    
-    def __init__(self, max_size: int = 1000):
-        self.buffer = deque(maxlen=max_size)
-        self.lock = threading.Lock()
-        
-    def add_sample(self, timestamp: float, channels: List[int]):
-        """Add a sample to the buffer."""
-        with self.lock:
-            self.buffer.append((timestamp, channels))
-    
-    def get_recent_samples(self, count: int) -> List[Tuple[float, List[int]]]:
-        """Get the most recent samples."""
-        with self.lock:
-            if count >= len(self.buffer):
-                return list(self.buffer)
-            else:
-                return list(self.buffer)[-count:]
+    """Lock-free single-producer circular buffer for samples.
     
-    def get_all_samples(self) -> List[Tuple[float, List[int]]]:
+    Stored as struct-of-arrays: one timestamp array and one
+    (capacity, channels) array of ADC counts, indexed by a running head.
+    Only the reading thread writes; it fills the slots first and then
+    publishes them with a single store to `head`, so consumers never see
+    unwritten slots and no lock is taken on the hot path.
+    """
+    
+    def __init__(self, channels: int, capacity: int = 1000):
+        self.capacity = capacity
+        self.ts = np.empty(capacity, dtype=np.float64)
+        self.adc = np.empty((capacity, channels), dtype=np.uint16)
+        self.head = 0  # total samples written (published)
+        self._batch_event = threading.Event()  # set whenever samples are published
+        
+    def add_sample(self, timestamp: float, channels: np.ndarray):
+        """Add a sample to the buffer (producer thread only)."""
+        head = self.head
+        idx = head % self.capacity
+        self.ts[idx] = timestamp
+        self.adc[idx] = channels
+        self.head = head + 1
+        self._batch_event.set()
+    
+    def add_batch(self, timestamps: np.ndarray, adc: np.ndarray):
+        """Add N samples ((N,) timestamps, (N, channels) ADC) (producer thread only)."""
+        head = self.head
+        n = len(adc)
+        skip = max(0, n - self.capacity)  # only the newest `capacity` survive
+        timestamps, adc = timestamps[skip:], adc[skip:]
+        m = n - skip
+        start = (head + skip) % self.capacity
+        first = min(m, self.capacity - start)
+        self.ts[start:start + first] = timestamps[:first]
+        self.adc[start:start + first] = adc[:first]
+        if first < m:
+            self.ts[:m - first] = timestamps[first:]
+            self.adc[:m - first] = adc[first:]
+        self.head = head + n
+        self._batch_event.set()
+    
+    def wait_for_data(self, timeout: float) -> bool:
+        """Block until new samples are published or timeout; True if any were."""
+        published = self._batch_event.wait(timeout)
+        self._batch_event.clear()
+        return published
+    
+    def get_recent_window(self, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the most recent samples as (timestamps, adc) arrays, oldest first.
+        
+        Reads against a snapshot of `head`. Returns views into the ring
+        when the window doesn't wrap, so the oldest rows may be
+        overwritten if the producer laps the buffer while they are used.
+        """
+        return self._window(self.head, count)
+    
+    def get_since(self, start: int) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Copy the samples published after running index `start`.
+        
+        Returns (timestamps, adc, head); pass head back in as the next
+        start. Samples older than `capacity` behind head are lost.
+        """
+        head = self.head
+        timestamps, adc = self._window(head, head - start)
+        return timestamps.copy(), adc.copy(), head
+    
+    def _window(self, head: int, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The last `count` samples before running index `head`."""
+        n = min(count, head, self.capacity)
+        end = head % self.capacity
+        start = end - n
+        if start >= 0:
+            return self.ts[start:end], self.adc[start:end]
+        return (np.concatenate((self.ts[start:], self.ts[:end])),
+                np.concatenate((self.adc[start:], self.adc[:end])))
+    
+    def get_all_samples(self) -> Tuple[np.ndarray, np.ndarray]:
         """Get all samples."""
-        with self.lock:
-            return list(self.buffer)
+        return self.get_recent_window(self.capacity)
 
 
 class FIFOReader:
@@ -100,7 +202,21 @@ class FIFOReader:
         self.config = config
         self.running = False
         self.fifo_fd = None
-        self.sample_buffer = SampleBuffer()
+        self._csv_rest = b""  # partial CSV line carried to the next read
+        self.sample_buffer = SampleBuffer(config.channels)
+        self._voltage_buf = np.empty(config.channels, dtype=np.float64)
+        # Binary batch layout: READ_BATCH samples of `channels` values each
+        self._sample_dtype = np.dtype(np.uint8) if config.sample_width == 1 else np.dtype('<u2')
+        self._sample_bytes = config.channels * config.sample_width
+        # Raw byte buffer the kernel reads into directly (no bytes objects)
+        self._batch_buf = np.empty(self._sample_bytes * READ_BATCH, dtype=np.uint8)
+        self._batch_view = memoryview(self._batch_buf)
+        # [start, end) of an incomplete trailing sample left by the last read
+        self._tail = (0, 0)
+        self.eof = False  # writer side of the FIFO is closed
+        # Cached wall-clock prefix for log timestamps
+        self._last_sec = None
+        self._last_hms = ""
         self.stats = {
             'samples_read': 0,
             'errors': 0,
@@ -119,52 +235,91 @@ class FIFOReader:
             print(f"Failed to open FIFO: {e}")
             return False
     
-    def read_binary_samples(self) -> Optional[List[int]]:
-        """Read binary samples from FIFO."""
+    def read_binary_batch(self) -> Optional[np.ndarray]:
+        """Read up to READ_BATCH binary samples from FIFO in one call.
+        
+        Returns an (N, channels) array, possibly empty if only part of a
+        sample has arrived, or None on EOF/error. The array is a view of
+        an internal buffer and is only valid until the next call.
+        """
         try:
-            # Read data for all channels (uint16 little-endian)
-            data_size = self.config.channels * 2  # 2 bytes per uint16
-            data = os.read(self.fifo_fd, data_size)
+            # Move the incomplete trailing sample of the last read to the front
+            start, end = self._tail
+            rem = end - start
+            if rem and start:
+                self._batch_buf[:rem] = self._batch_buf[start:end]
+            self._tail = (0, rem)
             
-            if len(data) != data_size:
+            # Scatter straight into the preallocated buffer after the leftovers
+            n = os.readv(self.fifo_fd, [self._batch_view[rem:]])
+            if not n:
+                self.eof = True
                 return None
-                
-            # Unpack as little-endian uint16
-            samples = list(struct.unpack(f"<{self.config.channels}H", data))
-            return samples
+            
+            total = rem + n
+            usable = total - total % self._sample_bytes
+            self._tail = (usable, total)
+            
+            # Reinterpret complete samples (uint8 or little-endian uint16) in place
+            return self._batch_buf[:usable].view(self._sample_dtype).reshape(-1, self.config.channels)
             
         except Exception as e:
             print(f"Binary read error: {e}")
             self.stats['errors'] += 1
             return None
     
-    def read_csv_samples(self) -> Optional[Tuple[float, List[int]]]:
-        """Read CSV samples from FIFO."""
+    def read_csv_batch(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Read and parse all complete CSV lines currently in the FIFO.
+        
+        Returns (timestamps, adc) arrays of shape (N,) and (N, channels),
+        possibly empty if no full line has arrived, or None on EOF/error.
+        """
         try:
-            # Read until newline
-            line = b""
-            while True:
-                char = os.read(self.fifo_fd, 1)
-                if not char:
-                    return None
-                if char == b'\n':
-                    break
-                line += char
-            
-            # Parse CSV line: timestamp,ch0,ch1,ch2,...
-            parts = line.decode().strip().split(',')
-            if len(parts) != self.config.channels + 1:
+            # Raw read: returns whatever is buffered in the pipe (up to
+            # CSV_CHUNK) and holds no lock, so stop() can close the fd
+            chunk = os.read(self.fifo_fd, CSV_CHUNK)
+            if not chunk:
+                self.eof = True
                 return None
-                
-            timestamp = float(parts[0])
-            channels = [int(x) for x in parts[1:]]
-            return timestamp, channels
+            
+            # Parse only up to the last newline; stash the partial line
+            data = self._csv_rest + chunk
+            cut = data.rfind(b'\n') + 1
+            self._csv_rest = data[cut:]
+            if not cut:
+                return np.empty(0), np.empty((0, self.config.channels), dtype=np.uint16)
+            
+            # Parse all lines (timestamp,ch0,ch1,ch2,...) in one C call
+            try:
+                values = np.loadtxt(io.BytesIO(data[:cut]), delimiter=',', ndmin=2)
+                if values.shape[1] != self.config.channels + 1:
+                    raise ValueError(f"expected {self.config.channels + 1} columns")
+            except ValueError:
+                values = self._parse_csv_lines(data[:cut])
+            
+            return values[:, 0], values[:, 1:].astype(np.uint16)
             
         except Exception as e:
             print(f"CSV read error: {e}")
             self.stats['errors'] += 1
             return None
     
+    def _parse_csv_lines(self, data: bytes) -> np.ndarray:
+        """Slow path: parse line by line, skipping malformed lines."""
+        rows = []
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                values = [float(v) for v in line.split(b',')]
+            except ValueError:
+                values = None
+            if values is not None and len(values) == self.config.channels + 1:
+                rows.append(values)
+            else:
+                self.stats['errors'] += 1
+        return np.array(rows).reshape(-1, self.config.channels + 1)
+    
     def reading_loop(self):
         """Main reading loop."""
         self.running = True
@@ -175,18 +330,24 @@ class FIFOReader:
         while self.running:
             try:
                 if self.config.data_format == "binary":
-                    samples = self.read_binary_samples()
-                    if samples:
-                        timestamp = time.time()
-                        self.sample_buffer.add_sample(timestamp, samples)
-                        self.stats['samples_read'] += 1
+                    batch = self.read_binary_batch()
+                    if batch is not None and len(batch):
+                        timestamps = np.full(len(batch), time.time())
+                        self.sample_buffer.add_batch(timestamps, batch)
+                        self.stats['samples_read'] += len(batch)
                         
                 elif self.config.data_format == "csv":
-                    result = self.read_csv_samples()
-                    if result:
-                        timestamp, samples = result
-                        self.sample_buffer.add_sample(timestamp, samples)
-                        self.stats['samples_read'] += 1
+                    result = self.read_csv_batch()
+                    if result is not None and len(result[0]):
+                        timestamps, samples = result
+                        self.sample_buffer.add_batch(timestamps, samples)
+                        self.stats['samples_read'] += len(timestamps)
+                
+                if self.eof:
+                    # No writer: reads return immediately, so back off
+                    # instead of spinning on empty syscalls
+                    time.sleep(EOF_RETRY_INTERVAL)
+                    self.eof = False
                         
             except Exception as e:
                 print(f"Reading error: {e}")
@@ -199,11 +360,29 @@ class FIFOReader:
         adc_value = max(0, min(adc_value, self.config.max_adc_value))
         return adc_value * self.config.voltage_per_count
     
+    def adc_to_voltage_array(self, adc_values: np.ndarray,
+                             out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Convert an array of ADC values to voltages in one vectorized pass."""
+        if out is None:
+            out = np.empty(np.shape(adc_values), dtype=np.float64)
+        # Clamp to valid range and scale
+        adc_batch_to_voltage(np.atleast_2d(adc_values), self.config.voltage_per_count,
+                             self.config.max_adc_value, np.atleast_2d(out))
+        return out
+    
     def print_sample_stats(self, timestamp: float, samples: List[int]):
         """Print sample statistics."""
-        voltages = [self.adc_to_voltage(s) for s in samples]
+        voltages = self.adc_to_voltage_array(np.asarray(samples, dtype=np.uint16),
+                                             out=self._voltage_buf)
+        
+        # Only re-render HH:MM:SS when the second changes
+        sec = int(timestamp)
+        if sec != self._last_sec:
+            self._last_sec = sec
+            self._last_hms = time.strftime('%H:%M:%S', time.localtime(sec))
+        ms = int((timestamp - sec) * 1000)
         
-        print(f"[{datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-3]}] "
+        print(f"[{self._last_hms}.{ms:03d}] "
               f"ADC: {samples} | "
               f"Voltage: {[f'{v:.3f}V' for v in voltages]} | "
               f"Samples: {self.stats['samples_read']} | "
@@ -274,40 +453,51 @@ class RealTimePlotter:
         
         plt.tight_layout()
         
+        # Fixed x-axis: the window width never changes, so only y data
+        # is updated per frame
+        window = self.config.plot_window_size
+        self._x = np.arange(window)
+        self._x_len = window  # length of the x data currently on the lines
+        for ax in self.axes:
+            ax.set_xlim(0, window)
+        # All animated artists, returned from every update for blitting
+        self._all_lines = tuple(self.adc_lines + self.voltage_lines)
+        for line in self._all_lines:
+            line.set_xdata(self._x)
+            line.set_ydata(np.full(window, np.nan))
+        
+        # Voltage window reused across frames (Line2D copies on set_data);
+        # float32 is plenty for display and halves the bytes handed over
+        self._voltage_buf = np.empty((window, self.config.channels), dtype=np.float32)
+        self._vpc_f32 = np.float32(self.config.voltage_per_count)
+        
     def update_plot(self, frame):
         """Update plot with latest data."""
-        samples = self.sample_buffer.get_recent_samples(self.config.plot_window_size)
-        
-        if not samples:
-            return self.adc_lines + self.voltage_lines
-        
-        # Extract data
-        x_data = list(range(len(samples)))
-        adc_data = [[] for _ in range(self.config.channels)]
-        voltage_data = [[] for _ in range(self.config.channels)]
-        
-        for _, channels in samples:
-            for i, value in enumerate(channels):
-                if i < self.config.channels:
-                    adc_data[i].append(value)
-                    voltage_data[i].append(value * self.config.voltage_per_count)
-        
-        # Update ADC lines
-        for i, line in enumerate(self.adc_lines):
-            if i < len(adc_data) and adc_data[i]:
-                line.set_data(x_data, adc_data[i])
-                
-        # Update voltage lines  
-        for i, line in enumerate(self.voltage_lines):
-            if i < len(voltage_data) and voltage_data[i]:
-                line.set_data(x_data, voltage_data[i])
+        _, adc_data = self.sample_buffer.get_recent_window(self.config.plot_window_size)
+        
+        if not len(adc_data):
+            return self._all_lines
         
-        # Update x-axis
-        if x_data:
-            for ax in self.axes:
-                ax.set_xlim(0, len(x_data))
+        # Per-channel data are column views of the (samples, channels) window
+        n = len(adc_data)
+        voltage_data = np.multiply(adc_data, self._vpc_f32, out=self._voltage_buf[:n])
         
-        return self.adc_lines + self.voltage_lines
+        if n == self._x_len:
+            # Window size unchanged since last frame: only swap in new y data
+            for i, line in enumerate(self.adc_lines):
+                line.set_ydata(adc_data[:, i])
+            for i, line in enumerate(self.voltage_lines):
+                line.set_ydata(voltage_data[:, i])
+        else:
+            # Still filling up: x grows with the number of samples
+            self._x_len = n
+            x_data = self._x[:n]
+            for i, line in enumerate(self.adc_lines):
+                line.set_data(x_data, adc_data[:, i])
+            for i, line in enumerate(self.voltage_lines):
+                line.set_data(x_data, voltage_data[:, i])
+        
+        return self._all_lines
     
     def start_animation(self):
         """Start the animation."""
@@ -327,6 +517,11 @@ class STM32EmulatorReader:
         self.plotter = None
         self.running = False
         self.output_file = None
+        # Output chunks waiting for the next bulk write: (timestamps, adc rows)
+        self._pending_rows = []
+        self._last_flush = time.monotonic()
+        self._output_fmt = ",".join(["%.6f"] + ["%d"] * config.channels +
+                                    ["%.6f"] * config.channels)
         
         # Signal handling
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -353,6 +548,10 @@ class STM32EmulatorReader:
                 print(f"Failed to open output file: {e}")
                 return False
         
+        # Compile the conversion kernel now rather than on the first sample
+        if NUMBA_AVAILABLE:
+            self.reader.adc_to_voltage_array(np.zeros(self.config.channels, dtype=np.uint16))
+        
         # Open FIFO
         if not self.reader.open_fifo():
             return False
@@ -383,30 +582,29 @@ class STM32EmulatorReader:
             plot_thread = threading.Thread(target=self.plotter.start_animation, daemon=True)
             plot_thread.start()
         
-        # Main monitoring loop
+        # Main monitoring loop: wakes when the reader publishes samples
+        sample_buffer = self.reader.sample_buffer
         last_log_count = 0
+        consumed = 0  # running index of the last sample handled
         
         try:
             while self.running:
-                time.sleep(1.0)
-                
-                # Get latest samples for logging
-                recent_samples = self.reader.sample_buffer.get_recent_samples(10)
-                if recent_samples:
-                    latest_timestamp, latest_channels = recent_samples[-1]
-                    
-                    # Log at intervals
-                    if (self.reader.stats['samples_read'] - last_log_count) >= self.config.log_interval:
-                        self.reader.print_sample_stats(latest_timestamp, latest_channels)
-                        last_log_count = self.reader.stats['samples_read']
+                if sample_buffer.wait_for_data(timeout=1.0):
+                    # Drain everything published since the last wake-up
+                    timestamps, adc, consumed = sample_buffer.get_since(consumed)
+                    if len(timestamps):
+                        # Log at intervals
+                        if (self.reader.stats['samples_read'] - last_log_count) >= self.config.log_interval:
+                            self.reader.print_sample_stats(float(timestamps[-1]), adc[-1].tolist())
+                            last_log_count = self.reader.stats['samples_read']
                         
-                        # Write to output file
+                        # Queue every sample for the output file
                         if self.output_file:
-                            voltages = [self.reader.adc_to_voltage(s) for s in latest_channels]
-                            line = f"{latest_timestamp:.6f}," + ",".join(map(str, latest_channels))
-                            line += "," + ",".join(f"{v:.6f}" for v in voltages) + "\n"
-                            self.output_file.write(line)
-                            self.output_file.flush()
+                            self._pending_rows.append((timestamps, adc))
+                
+                if (self._pending_rows and
+                        time.monotonic() - self._last_flush >= OUTPUT_FLUSH_INTERVAL):
+                    self.flush_output()
                 
         except KeyboardInterrupt:
             print("\nInterrupted by user")
@@ -415,6 +613,18 @@ class STM32EmulatorReader:
         finally:
             self.stop()
     
+    def flush_output(self):
+        """Write all pending output rows in one formatted pass."""
+        self._last_flush = time.monotonic()
+        if not self._pending_rows:
+            return
+        timestamps = np.concatenate([ts for ts, _ in self._pending_rows])
+        adc = np.concatenate([rows for _, rows in self._pending_rows])
+        self._pending_rows = []
+        voltages = self.reader.adc_to_voltage_array(adc)
+        np.savetxt(self.output_file, np.column_stack((timestamps, adc, voltages)),
+                   fmt=self._output_fmt)
+    
     def stop(self):
         """Stop the application."""
         if not self.running:
@@ -428,6 +638,7 @@ class STM32EmulatorReader:
         
         # Close output file
         if self.output_file:
+            self.flush_output()
             self.output_file.close()
         
         # Print final statistics
@@ -25,7 +25,12 @@ import time
 import struct
 import logging
 import argparse
+import zlib
+import threading
 import numpy as np
+from queue import Queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, Tuple, Dict, Any
 from dataclasses import dataclass, asdict
@@ -38,6 +43,53 @@ except ImportError:
     print("Error: opencv-python is required. Install with: uv add opencv-python")
     sys.exit(1)
 
+# Optional SciPy for faster filtering (falls back to NumPy)
+try:
+    from scipy import signal as sp_signal
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# Optional JIT support for the frame raster kernel
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _fill_raster(out: np.ndarray, template: np.ndarray, luma: np.ndarray,
+                 vblank_top: int, active_start: int) -> np.ndarray:
+    """Write every (lines, samples) row of `out` once: template, with luma in the active region."""
+    active_lines, active_samples = luma.shape
+    active_end = active_start + active_samples
+    for r in range(out.shape[0]):
+        v = r - vblank_top
+        if 0 <= v < active_lines:
+            for c in range(active_start):
+                out[r, c] = template[c]
+            for c in range(active_samples):
+                out[r, active_start + c] = luma[v, c]
+            for c in range(active_end, out.shape[1]):
+                out[r, c] = template[c]
+        else:
+            for c in range(out.shape[1]):
+                out[r, c] = template[c]
+    return out
+
+
+if NUMBA_AVAILABLE:
+    # nogil so the converter's encoder threads can fill rasters concurrently
+    fill_raster = njit(cache=True, nogil=True)(_fill_raster)
+else:
+    def fill_raster(out: np.ndarray, template: np.ndarray, luma: np.ndarray,
+                    vblank_top: int, active_start: int) -> np.ndarray:
+        """NumPy fallback: broadcast the template, then overwrite the active block."""
+        np.copyto(out, template)
+        out[vblank_top:vblank_top + luma.shape[0],
+            active_start:active_start + luma.shape[1]] = luma
+        return out
+
 
 @dataclass
 class AnalogStandard:
@@ -100,6 +152,10 @@ class AnalogConfig:
     resolution: Tuple[int, int] = (640, 480)  # Source video resolution
     active_lines: int = 480  # Lines containing actual video
     bandwidth_mhz: float = 4.2  # Luminance bandwidth (NTSC ~4.2 MHz)
+    lpf_mode: str = 'fir'  # 'fir' = full-frame FIR, 'iir' = per-line Butterworth (SciPy)
+    lpf_attenuation_db: float = 40.0  # FIR stop-band attenuation
+    lpf_transition_mhz: float = 1.0  # FIR transition width, centred on bandwidth_mhz
+    sample_format: str = 'float32'  # On-disk sample type: 'float32', 'float16' or 'int16'
     add_noise: bool = False
     noise_amplitude: float = 0.02
     
@@ -132,8 +188,30 @@ class CompositeEncoder:
         # Pre-generate line template
         self._line_template = self._create_line_template()
         
+        # Reusable (lines, samples_per_line) raster, filled in place per frame
+        self._frame_buf = np.empty(config.samples_per_frame, dtype=np.float32)
+        self._frame_2d = self._frame_buf.reshape(self.std.lines_per_frame,
+                                                 config.samples_per_line)
+        
+        # Noise generator (PCG64) drawing float32 straight into a reused buffer
+        self._rng = np.random.default_rng()
+        self._noise_buf = (np.empty(config.samples_per_frame, dtype=np.float32)
+                           if config.add_noise else None)
+        
+        # Last input frame's hash/shape and its band-limited raster
+        self._last_hash = None
+        self._last_shape = None
+        self._last_filtered = None
+        
+        # Luminance scaling folded into one multiply-add on a reusable buffer
+        width, height = config.resolution[0], config.active_lines
+        self._lum_scale = np.float32((self.std.white_level - self.std.black_level) / 255.0)
+        self._lum_bias = np.float32(self.std.black_level)
+        self._lum_buf = np.empty((height, width), dtype=np.float32)
+        
         # Create low-pass filter for bandwidth limiting
         self._lpf_kernel = self._create_lpf_kernel()
+        self._lpf_sos = self._create_lpf_sos() if config.lpf_mode == 'iir' else None
         
     def _calculate_timing(self):
         """Calculate sample positions for different line segments."""
@@ -178,25 +256,51 @@ class CompositeEncoder:
         bandwidth = self.config.bandwidth_mhz * 1e6
         cutoff_normalized = bandwidth / self.config.sample_rate
         
+        # Kaiser design: the kernel is only as long as the attenuation and
+        # transition width require (same formulas as scipy.signal.kaiserord)
+        atten = self.config.lpf_attenuation_db
+        if self.config.lpf_transition_mhz <= 0:
+            raise ValueError("lpf_transition_mhz must be positive")
+        # Normalized to Nyquist; a transition wider than Nyquist is clamped
+        width = min(self.config.lpf_transition_mhz * 1e6 / (self.config.sample_rate / 2), 1.0)
+        if atten > 50:
+            beta = 0.1102 * (atten - 8.7)
+        elif atten > 21:
+            beta = 0.5842 * (atten - 21) ** 0.4 + 0.07886 * (atten - 21)
+        else:
+            beta = 0.0
+        
         # Kernel size (must be odd)
-        kernel_size = 31
+        kernel_size = int(np.ceil((atten - 7.95) / (2.285 * np.pi * width))) + 1
+        kernel_size = max(kernel_size, 3) | 1
         center = kernel_size // 2
         
-        # Generate sinc kernel
-        t = np.arange(kernel_size) - center
-        kernel = np.sinc(2 * cutoff_normalized * t)
+        # Generate sinc kernel (float32 throughout, matching the signal)
+        t = np.arange(-center, center + 1, dtype=np.float32)
+        kernel = np.sinc(np.float32(2 * cutoff_normalized) * t)
         
-        # Apply Hamming window
-        window = np.hamming(kernel_size)
-        kernel *= window
+        # Apply Kaiser window
+        kernel *= np.kaiser(kernel_size, beta).astype(np.float32)
         
         # Normalize
-        kernel /= np.sum(kernel)
+        kernel /= kernel.sum()
         
-        return kernel.astype(np.float32)
+        return kernel
+    
+    def _create_lpf_sos(self) -> Optional[np.ndarray]:
+        """Create IIR low-pass filter (second-order sections) for per-line filtering."""
+        cutoff = self.config.bandwidth_mhz * 1e6 / (self.config.sample_rate / 2)
+        if not SCIPY_AVAILABLE or cutoff >= 1.0:
+            reason = "requires scipy" if not SCIPY_AVAILABLE else "needs bandwidth below Nyquist"
+            logging.warning(f"IIR filtering {reason}, falling back to FIR")
+            # Record the mode actually used (the file header reads it)
+            self.config.lpf_mode = 'fir'
+            return None
+        
+        return sp_signal.butter(6, cutoff, output='sos')
     
     def frame_to_luminance(self, frame: np.ndarray) -> np.ndarray:
-        """Convert BGR frame to luminance values."""
+        """Convert BGR frame to luminance values (buffer reused per call)."""
         # Convert to grayscale using proper luminance weights
         # Y = 0.299*R + 0.587*G + 0.114*B
         if len(frame.shape) == 3:
@@ -211,18 +315,22 @@ class CompositeEncoder:
         if gray.shape != (height, width):
             gray = cv2.resize(gray, (width, height), interpolation=cv2.INTER_LINEAR)
         
-        # Normalize to video range (black_level to white_level)
-        normalized = gray.astype(np.float32) / 255.0
-        scaled = (self.std.black_level + 
-                 normalized * (self.std.white_level - self.std.black_level))
+        # Normalize to video range (black_level to white_level) in one pass
+        # from uint8 straight into the float32 buffer
+        np.multiply(gray, self._lum_scale, out=self._lum_buf, dtype=np.float32)
+        self._lum_buf += self._lum_bias
         
-        return scaled
+        return self._lum_buf
     
     def apply_bandwidth_limiting(self, signal: np.ndarray) -> np.ndarray:
         """Apply low-pass filter to simulate bandwidth limitations."""
-        # Convolve with LPF kernel
-        filtered = np.convolve(signal, self._lpf_kernel, mode='same')
-        return filtered.astype(np.float32)
+        # Convolve with LPF kernel; overlap-add is ~2x faster than direct
+        # convolution for a short kernel over a whole frame
+        if SCIPY_AVAILABLE:
+            filtered = sp_signal.oaconvolve(signal, self._lpf_kernel, mode='same')
+        else:
+            filtered = np.convolve(signal, self._lpf_kernel, mode='same')
+        return filtered.astype(np.float32, copy=False)
     
     def encode_line(self, line_pixels: Optional[np.ndarray] = None) -> np.ndarray:
         """Encode one horizontal line with sync, blanking, and video."""
@@ -243,58 +351,66 @@ class CompositeEncoder:
         return line
     
     def encode_frame(self, frame: np.ndarray) -> np.ndarray:
-        """Encode complete frame with vertical blanking."""
+        """Encode complete frame with vertical blanking.
+        
+        The returned array may be reused by the next call; copy it to keep it.
+        """
+        # Static sources: an unchanged input frame gives the same
+        # band-limited raster, so reuse the last one and skip luminance,
+        # resampling and filtering (crc32 reads the frame without copying)
+        frame_hash = zlib.crc32(np.ascontiguousarray(frame))
+        if frame_hash != self._last_hash or frame.shape != self._last_shape:
+            self._last_filtered = self._band_limited_frame(frame)
+            self._last_hash, self._last_shape = frame_hash, frame.shape
+            if not self.config.add_noise:
+                # Clip once; repeats return the cached raster as-is
+                np.clip(self._last_filtered, self.std.sync_tip, self.std.white_level,
+                        out=self._last_filtered)
+        output = self._last_filtered
+        
+        # Add noise if enabled, into its own buffer so the cache stays clean
+        if self.config.add_noise:
+            self._rng.standard_normal(dtype=np.float32, out=self._noise_buf)
+            self._noise_buf *= self.config.noise_amplitude
+            self._noise_buf += output
+            output = self._noise_buf
+            
+            # Clip to valid range (in place)
+            np.clip(output, self.std.sync_tip, self.std.white_level, out=output)
+        
+        return output
+    
+    def _band_limited_frame(self, frame: np.ndarray) -> np.ndarray:
+        """Build the sync/blanking/video raster and apply bandwidth limiting (unclipped)."""
         lines_per_frame = self.std.lines_per_frame
         active_lines = self.config.active_lines
         
         # Calculate vertical blanking
         vblank_lines = lines_per_frame - active_lines
         vblank_top = vblank_lines // 2
-        vblank_bottom = vblank_lines - vblank_top
         
-        # Convert frame to luminance
+        # Convert frame to luminance and resample every line to the active
+        # sample count in one call (replaces a per-line np.interp)
         luma = self.frame_to_luminance(frame)
-        
-        # Allocate output
-        output = np.zeros(self.config.samples_per_frame, dtype=np.float32)
-        
-        line_idx = 0
-        
-        # Top vertical blanking (with V-sync)
-        for i in range(vblank_top):
-            line_data = self.encode_line(None)  # Blank line
-            start = line_idx * self.config.samples_per_line
-            end = start + len(line_data)
-            output[start:end] = line_data
-            line_idx += 1
-        
-        # Active video lines
-        for i in range(active_lines):
-            line_pixels = luma[i, :]
-            line_data = self.encode_line(line_pixels)
-            start = line_idx * self.config.samples_per_line
-            end = start + len(line_data)
-            output[start:end] = line_data
-            line_idx += 1
-        
-        # Bottom vertical blanking
-        for i in range(vblank_bottom):
-            line_data = self.encode_line(None)
-            start = line_idx * self.config.samples_per_line
-            end = start + len(line_data)
-            output[start:end] = line_data
-            line_idx += 1
-        
-        # Apply bandwidth limiting to entire frame
-        output = self.apply_bandwidth_limiting(output)
-        
-        # Add noise if enabled
-        if self.config.add_noise:
-            noise = np.random.normal(0, self.config.noise_amplitude, len(output))
-            output += noise.astype(np.float32)
-        
-        # Clip to valid range
-        output = np.clip(output, self.std.sync_tip, self.std.white_level)
+        if luma.shape[1] != self.active_samples:
+            luma = cv2.resize(luma, (self.active_samples, active_lines),
+                              interpolation=cv2.INTER_LINEAR)
+        
+        # IIR mode: band-limit only the active video, all lines in one call,
+        # so sync edges stay sharp and nothing bleeds across line boundaries
+        if self._lpf_sos is not None:
+            luma = sp_signal.sosfiltfilt(self._lpf_sos, luma, axis=1).astype(np.float32)
+        
+        # Build the whole frame in the reusable raster: every line is the
+        # sync/blanking template with the video lines' active region filled
+        # from luma (a single write pass when JIT-compiled)
+        fill_raster(self._frame_2d, self._line_template, luma,
+                    vblank_top, self.active_start)
+        output = self._frame_buf
+        
+        # FIR mode: apply bandwidth limiting to entire frame
+        if self._lpf_sos is None:
+            output = self.apply_bandwidth_limiting(output)
         
         return output
 
@@ -350,6 +466,7 @@ class AnalogFileWriter:
     
     MAGIC = b'ANLG'
     VERSION = 1
+    QUEUE_DEPTH = 4  # Frames buffered between encoder and writer thread
     
     def __init__(self, filename: str, config: AnalogConfig):
         self.filename = filename
@@ -357,11 +474,34 @@ class AnalogFileWriter:
         self.file = None
         self.frames_written = 0
         
+        # Background writer so disk IO overlaps with encoding; frames travel
+        # in preallocated on-disk buffers (free -> queued -> written -> free)
+        self._dtype = np.dtype(config.sample_format).newbyteorder('<')
+        self._queue = Queue()
+        self._free = Queue()
+        self._quant_buf = None
+        self._thread = None
+        self._error = None
+        self._error_reported = False
+        
+        # int16 quantization maps [sync_tip, white] onto the full code range,
+        # so voltage = code * scale + offset
+        std = config.standard
+        self._int16 = config.sample_format == 'int16'
+        self._scale = (std.white_level - std.sync_tip) / 65535.0
+        self._offset = std.sync_tip + 32768 * self._scale
+        
     def open(self) -> bool:
         """Open file and write header."""
         try:
             self.file = open(self.filename, 'wb')
             self._write_header()
+            for _ in range(self.QUEUE_DEPTH):
+                self._free.put(np.empty(self.config.samples_per_frame, dtype=self._dtype))
+            if self._int16:
+                self._quant_buf = np.empty(self.config.samples_per_frame, dtype=np.float32)
+            self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self._thread.start()
             logging.info(f"Created analog signal file: {self.filename}")
             return True
         except Exception as e:
@@ -385,6 +525,8 @@ class AnalogFileWriter:
             'samples_per_frame': self.config.samples_per_frame,
             'active_lines': self.config.active_lines,
             'bandwidth_mhz': self.config.bandwidth_mhz,
+            'lpf_mode': self.config.lpf_mode,
+            'dtype': self.config.sample_format,
             'voltage_levels': {
                 'sync_tip': self.config.standard.sync_tip,
                 'blanking': self.config.standard.blanking_level,
@@ -393,6 +535,9 @@ class AnalogFileWriter:
             },
             'timestamp': datetime.now().isoformat()
         }
+        if self._int16:
+            metadata['scale'] = self._scale
+            metadata['offset'] = self._offset
         
         # Serialize metadata as JSON
         metadata_json = json.dumps(metadata, indent=2)
@@ -404,18 +549,64 @@ class AnalogFileWriter:
         
         logging.debug(f"Wrote header with metadata: {len(metadata_bytes)} bytes")
     
+    def _to_int16(self, signal: np.ndarray, out: np.ndarray):
+        """Quantize voltages to int16 codes (~96 dB SNR, half the bytes)."""
+        codes = self._quant_buf
+        np.subtract(signal, self._offset, out=codes)
+        codes *= 1.0 / self._scale
+        np.rint(codes, out=codes)
+        np.clip(codes, -32768, 32767, out=codes)
+        np.copyto(out, codes, casting='unsafe')
+    
+    def _writer_loop(self):
+        """Write queued frames to disk (runs in separate thread)."""
+        while True:
+            buf = self._queue.get()
+            if buf is None:
+                break
+            # Skip writes after an error but keep recycling buffers so the
+            # producer never blocks
+            if self._error is None:
+                try:
+                    self.file.write(memoryview(buf).cast('B'))
+                except Exception as e:
+                    self._error = e
+            self._free.put(buf)
+    
     def write_frame(self, signal: np.ndarray):
-        """Write one frame of analog signal."""
-        # Convert to float32 and write
-        signal_bytes = signal.astype(np.float32).tobytes()
-        self.file.write(signal_bytes)
+        """Queue one frame of analog signal for writing."""
+        if self._error is not None:
+            self._error_reported = True
+            raise self._error
+        
+        # Convert into a free on-disk buffer (blocks while all are in
+        # flight); the caller may reuse its own buffer right away
+        buf = self._free.get()
+        if self._int16:
+            self._to_int16(signal, buf)
+        else:
+            np.copyto(buf, signal, casting='same_kind')
+        self._queue.put(buf)
         self.frames_written += 1
     
     def close(self):
-        """Close file."""
+        """Flush queued frames and close file; raises if any write failed."""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
         if self.file:
-            self.file.close()
+            try:
+                self.file.close()
+            except Exception as e:
+                self._error = self._error or e
+            self.file = None
             logging.info(f"Wrote {self.frames_written} frames")
+        
+        # Report a background write error that write_frame has not raised yet
+        if self._error is not None and not self._error_reported:
+            self._error_reported = True
+            raise self._error
 
 
 class VideoToAnalogConverter:
@@ -435,6 +626,10 @@ class VideoToAnalogConverter:
             resolution=(args.width, args.height),
             active_lines=args.height,
             bandwidth_mhz=args.bandwidth,
+            lpf_mode=args.lpf,
+            lpf_attenuation_db=args.lpf_attenuation,
+            lpf_transition_mhz=args.lpf_transition,
+            sample_format=args.sample_format,
             add_noise=args.add_noise,
             noise_amplitude=args.noise_level
         )
@@ -471,44 +666,77 @@ class VideoToAnalogConverter:
         
         # Process frames
         frame_count = 0
+        frames_read = 0
         max_frames = self.args.max_frames if self.args.max_frames > 0 else float('inf')
         start_time = time.time()
         
+        # Encoding pipeline: frames are encoded on a thread pool (OpenCV and
+        # the SciPy/NumPy filter passes release the GIL) and written in
+        # order. Encoders reuse their buffers, so each in-flight frame
+        # borrows its own encoder until the writer has copied the result.
+        workers = max(1, self.args.workers)
+        encoders = Queue()
+        encoders.put(self.encoder)
+        for _ in range(workers - 1):
+            encoders.put(CompositeEncoder(self.config))
+        pending = deque()
+        
+        def encode(frame):
+            encoder = encoders.get()
+            return encoder, encoder.encode_frame(frame)
+        
+        def write_next():
+            nonlocal frame_count
+            encoder, analog_signal = pending.popleft().result()
+            
+            # Write to file
+            self.writer.write_frame(analog_signal)
+            encoders.put(encoder)
+            
+            frame_count += 1
+            
+            # Progress logging
+            if frame_count % 30 == 0:
+                elapsed = time.time() - start_time
+                fps = frame_count / elapsed
+                duration = frame_count / self.config.standard.fps
+                logging.info(f"Processed {frame_count} frames "
+                           f"({duration:.1f}s video) @ {fps:.1f} fps")
+        
         try:
-            while frame_count < max_frames:
-                # Read frame
-                frame = self.video_source.read_frame()
-                if frame is None:
-                    logging.info("End of video source")
-                    break
-                
-                # Encode to analog
-                analog_signal = self.encoder.encode_frame(frame)
-                
-                # Write to file
-                self.writer.write_frame(analog_signal)
-                
-                frame_count += 1
-                
-                # Progress logging
-                if frame_count % 30 == 0:
-                    elapsed = time.time() - start_time
-                    fps = frame_count / elapsed
-                    duration = frame_count / self.config.standard.fps
-                    logging.info(f"Processed {frame_count} frames "
-                               f"({duration:.1f}s video) @ {fps:.1f} fps")
-                
-                # Preview if enabled
-                if self.args.preview:
-                    cv2.imshow("Video Source", frame)
-                    if cv2.waitKey(1) & 0xFF == ord('q'):
-                        logging.info("Preview closed by user")
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                while frames_read < max_frames:
+                    # Read frame
+                    frame = self.video_source.read_frame()
+                    if frame is None:
+                        logging.info("End of video source")
                         break
+                    frames_read += 1
+                    
+                    # Encode to analog (in the background)
+                    pending.append(pool.submit(encode, frame))
+                    if len(pending) >= workers:
+                        write_next()
+                    
+                    # Preview if enabled
+                    if self.args.preview:
+                        cv2.imshow("Video Source", frame)
+                        if cv2.waitKey(1) & 0xFF == ord('q'):
+                            logging.info("Preview closed by user")
+                            break
+                
+                # Write frames still in flight
+                while pending:
+                    write_next()
+            
+            # Flush the writer before reporting success (raises on write errors)
+            self.writer.close()
             
             # Summary
             elapsed = time.time() - start_time
             total_samples = frame_count * self.config.samples_per_frame
-            file_size_mb = (total_samples * 4) / (1024 * 1024)  # float32 = 4 bytes
+            sample_bytes = np.dtype(self.config.sample_format).itemsize
+            file_size_mb = (total_samples * sample_bytes) / (1024 * 1024)
             
             logging.info(f"\nConversion complete:")
             logging.info(f"  Frames: {frame_count}")
@@ -527,7 +755,10 @@ class VideoToAnalogConverter:
             return False
         finally:
             self.video_source.close()
-            self.writer.close()
+            try:
+                self.writer.close()
+            except Exception as e:
+                logging.error(f"Write error: {e}")
             if self.args.preview:
                 cv2.destroyAllWindows()
 
@@ -554,6 +785,17 @@ def parse_arguments():
                        help='Video height in pixels')
     parser.add_argument('--bandwidth', type=float, default=4.2,
                        help='Luminance bandwidth in MHz')
+    parser.add_argument('--lpf', choices=['fir', 'iir'], default='fir',
+                       help='Bandwidth filter: full-frame FIR or per-line IIR (needs scipy)')
+    parser.add_argument('--lpf-attenuation', type=float, default=40.0,
+                       help='FIR stop-band attenuation in dB')
+    parser.add_argument('--lpf-transition', type=float, default=1.0,
+                       help='FIR transition width in MHz, centred on --bandwidth')
+    parser.add_argument('--sample-format', choices=['float32', 'float16', 'int16'],
+                       default='float32',
+                       help='On-disk sample type (float16/int16 halve file size)')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                       help='Frames encoded in parallel')
     parser.add_argument('--max-frames', type=int, default=0,
                        help='Maximum frames to process (0 = all)')
     parser.add_argument('--add-noise', action='store_true',
@@ -565,7 +807,11 @@ def parse_arguments():
     parser.add_argument('--verbose', action='store_true',
                        help='Enable verbose logging')
     
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.lpf_transition <= 0:
+        parser.error("--lpf-transition must be positive")
+    
+    return args
 
 
 def main():